@@ -0,0 +1,51 @@
+import os
+
+from livekit.agents import AgentSession, JobProcess, metrics, tokenize
+
+# All plugins are imported at module level. They must register on the main
+# thread (console mode runs prewarm on a worker thread), the turn detector's
+# inference runner must exist before cli.run_app, and under forkserver the
+# plugins loaded by the main process are what job processes inherit.
+from livekit.plugins import deepgram, google, murf, silero
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+# ---------------------------- Shared Prewarm -----------------------------
+
+
+def prewarm(proc: JobProcess):
+    proc.userdata["vad"] = silero.VAD.load()
+
+    # Build the reusable pipeline pieces ONCE per process boot
+    proc.userdata["sentence_tokenizer"] = tokenize.basic.SentenceTokenizer(
+        min_sentence_len=12
+    )
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(
+        model=os.getenv("LLM_MODEL", "gemini-2.5-flash-lite"),
+        temperature=0.3,
+    )
+    proc.userdata["tts"] = murf.TTS(
+        voice="en-US-matthew",
+        style="Conversation",
+        tokenizer=proc.userdata["sentence_tokenizer"],
+        text_pacing=True,
+    )
+
+    # One usage collector per process, shared by the sessions it runs
+    proc.userdata["usage_collector"] = metrics.UsageCollector()
+
+
+# ---------------------------- Session Builder -----------------------------
+
+
+def build_session(proc_userdata):
+    return AgentSession(
+        stt=proc_userdata["stt"],
+        llm=proc_userdata["llm"],
+        tts=proc_userdata["tts"],
+        # Needs a job context for the inference executor, so it is built per
+        # session; the model weights live in the shared inference process
+        turn_detection=MultilingualModel(),
+        vad=proc_userdata["vad"],
+        preemptive_generation=True,
+    )
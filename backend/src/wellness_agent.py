@@ -1,56 +1,150 @@
-from dotenv import load_dotenv
-load_dotenv(".env")
-
-import os
-import json
+import asyncio
 import logging
+import os
+from collections import deque
 from datetime import datetime
 
+import orjson
+from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
-    AgentSession,
     JobContext,
     JobProcess,
+    MetricsCollectedEvent,
     RoomInputOptions,
+    RunContext,
     WorkerOptions,
     cli,
-    tokenize,
     function_tool,
-    RunContext,
-    metrics,
-    MetricsCollectedEvent,
+    get_job_context,
 )
+from livekit.plugins import noise_cancellation
 
-from livekit.plugins import murf, google, deepgram, silero, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+import pipeline
 
 logger = logging.getLogger("wellness_agent")
 
-LOG_FILE = "wellness_log.json"
+LOG_FILE = "wellness_log.jsonl"
+LEGACY_LOG_FILE = "wellness_log.json"
+RECENT_LOGS_LIMIT = 50
+
+# Job processes are started with spawn/forkserver, which re-run this script as
+# __mp_main__ before creating their event loop, so the policy reaches them too.
+# Plain imports (tests, tooling) keep the default loop.
+if __name__ in ("__main__", "__mp_main__"):
+    try:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
 
 
-# ---------------------------- JSON Persistence -----------------------------
+# ---------------------------- JSONL Persistence ----------------------------
 
-def load_logs_from_disk():
+
+def migrate_legacy_log():
+    # Older builds rewrote the whole history as one JSON list; convert it once
+    if not os.path.exists(LEGACY_LOG_FILE):
+        return
+    if os.path.exists(LOG_FILE):
+        logger.warning(
+            "Ignoring %s because %s already exists", LEGACY_LOG_FILE, LOG_FILE
+        )
+        return
+
+    try:
+        with open(LEGACY_LOG_FILE, "rb") as f:
+            legacy_logs = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        legacy_logs = None
+    if not isinstance(legacy_logs, list):
+        logger.warning("Skipping unreadable legacy log %s", LEGACY_LOG_FILE)
+        return
+
+    try:
+        # "xb" fails if another job process converted the log first
+        with open(LOG_FILE, "xb") as f:
+            for entry in legacy_logs:
+                append_log(f, entry)
+    except FileExistsError:
+        return
+    logger.info("Converted %d entries from %s", len(legacy_logs), LEGACY_LOG_FILE)
+
+
+def load_recent_logs_from_disk(n):
     if not os.path.exists(LOG_FILE):
         return []
     try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+        with open(LOG_FILE, "rb") as f:
+            tail = deque((line for line in f if line.strip()), maxlen=n)
+    except OSError:
         return []
 
+    # Skip only unreadable lines, e.g. one truncated by a crash mid-write
+    logs = []
+    for line in tail:
+        try:
+            logs.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            logger.warning("Skipping malformed wellness log line: %r", line)
+    return logs
+
+
+def append_log(log_fd, entry):
+    # Buffered writes never write short, and flush hands the line to the OS
+    # without the cost of a close
+    log_fd.write(orjson.dumps(entry) + b"\n")
+    log_fd.flush()
+
+
+def normalize_goals(goals):
+    # The LLM occasionally sends a bare string instead of a list
+    if not isinstance(goals, (list, tuple)):
+        goals = [str(goals)]
+    return tuple(goals)
+
 
-def save_logs_to_disk(logs):
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
+def _log_write_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to save wellness check-in", exc_info=task.exception())
+
+
+def persist_entry(userdata, entry):
+    log_fd = userdata.get("log_fd")
+    if log_fd is None:
+        # The job is shutting down and the shared handle is gone; write
+        # synchronously so the entry is on disk before we confirm it
+        with open(LOG_FILE, "ab") as f:
+            append_log(f, entry)
+        return
+
+    # Append the new entry in the background so the reply isn't held up
+    pending = userdata["pending_writes"]
+    task = asyncio.create_task(asyncio.to_thread(append_log, log_fd, entry))
+    pending.add(task)
+    task.add_done_callback(pending.discard)
+    task.add_done_callback(_log_write_failure)
+
+
+async def close_log(userdata):
+    # Stop handing out the shared handle first, so no new background write can
+    # start, then wait until every in-flight write has finished
+    log_fd = userdata.pop("log_fd", None)
+    pending = userdata["pending_writes"]
+    while in_flight := [task for task in pending if not task.done()]:
+        await asyncio.wait(in_flight)
+
+    if log_fd is not None:
+        os.fsync(log_fd.fileno())
+        log_fd.close()
 
 
 # ---------------------------- Assistant -----------------------------
 
-class WellnessAssistant(Agent):
-    def __init__(self):
-        instructions = """
+# Keep this prompt static (no timestamps, room names or per-user data) so it
+# forms a stable prefix that Gemini's implicit prompt caching can reuse.
+_WELLNESS_INSTRUCTIONS = """
 You are a supportive and realistic health & wellness companion.
 You are NOT a medical professional and MUST NOT give medical advice.
 
@@ -72,10 +166,14 @@ Only call save_checkin when ALL required fields are available:
 - summary (string you create)
 
 Never call save_checkin early.
-"""
-        super().__init__(instructions=instructions)
+""".strip()  # noqa: RUF001
+
+
+class WellnessAssistant(Agent):
+    def __init__(self):
+        super().__init__(instructions=_WELLNESS_INSTRUCTIONS)
 
-    # ----------- TOOL: Save check-in to JSON file -------------
+    # ----------- TOOL: Save check-in to JSONL file ------------
 
     @function_tool
     async def save_checkin(
@@ -92,32 +190,37 @@ Never call save_checkin early.
         entry = {
             "timestamp": datetime.now().isoformat(),
             "mood": mood,
-            "goals": goals,
+            "goals": normalize_goals(goals),
             "summary": summary,
         }
 
-        # Retrieve logs stored in the process
-        logs = ctx.proc.userdata.get("wellness_logs", [])
-        logs.append(entry)
+        # RunContext has no process handle; the job context owns it
+        userdata = get_job_context().proc.userdata
 
-        # Save on disk
-        save_logs_to_disk(logs)
+        persist_entry(userdata, entry)
 
         # Save in memory for next interactions
-        ctx.proc.userdata["wellness_logs"] = logs
+        logs = userdata.setdefault("wellness_logs", deque(maxlen=RECENT_LOGS_LIMIT))
+        logs.append(entry)
 
         return "Your daily check-in has been saved. Thank you for sharing."
 
 
-
 # ---------------------------- Entrypoint -----------------------------
 
+
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    pipeline.prewarm(proc)
+    migrate_legacy_log()
+
+    # Keep only the most recent logs in memory; the JSONL file holds the rest
+    proc.userdata["wellness_logs"] = deque(
+        load_recent_logs_from_disk(RECENT_LOGS_LIMIT), maxlen=RECENT_LOGS_LIMIT
+    )
 
-    # Load wellness logs ONCE per process boot
-    previous_logs = load_logs_from_disk()
-    proc.userdata["wellness_logs"] = previous_logs
+    # Append handle held open for the process lifetime
+    proc.userdata["log_fd"] = open(LOG_FILE, "ab")  # noqa: SIM115
+    proc.userdata["pending_writes"] = set()
 
 
 async def entrypoint(ctx: JobContext):
@@ -125,42 +228,42 @@ async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
 
     # Voice/LLM Pipeline
-    session = AgentSession(
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
-        tts=murf.TTS(
-            voice="en-US-matthew",
-            style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
-            text_pacing=True,
-        ),
-        turn_detection=MultilingualModel(),
-        vad=ctx.proc.userdata["vad"],
-        preemptive_generation=True,
-    )
+    session = pipeline.build_session(ctx.proc.userdata)
 
-    usage = metrics.UsageCollector()
+    usage = ctx.proc.userdata["usage_collector"]
 
     @session.on("metrics_collected")
     def on_metrics(ev: MetricsCollectedEvent):
         usage.collect(ev.metrics)
 
+    # Job processes exit via os._exit, so atexit never runs; a job runs once per
+    # process, so this still logs the summary once per process
     async def log_usage():
         logger.info("Usage summary: %s", usage.get_summary())
 
     ctx.add_shutdown_callback(log_usage)
 
+    # Finish in-flight check-in writes, then flush them to stable storage once
+    # per job rather than per write. Job processes exit via os._exit, so the
+    # handle is closed here rather than from atexit.
+    async def sync_logs():
+        await close_log(ctx.proc.userdata)
+
+    ctx.add_shutdown_callback(sync_logs)
+
+    # Noise cancellation runs a model on every input frame; opt in via ENABLE_NC
+    nc = noise_cancellation.BVC() if os.getenv("ENABLE_NC", "0") == "1" else None
+
     await session.start(
         agent=WellnessAssistant(),
         room=ctx.room,
-        room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC()
-        ),
+        room_input_options=RoomInputOptions(noise_cancellation=nc),
     )
 
     await ctx.connect()
 
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    load_dotenv(".env")
 
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
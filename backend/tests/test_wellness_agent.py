@@ -0,0 +1,166 @@
+import logging
+from collections import deque
+from types import SimpleNamespace
+
+import orjson
+
+import wellness_agent
+from wellness_agent import (
+    WellnessAssistant,
+    append_log,
+    close_log,
+    load_recent_logs_from_disk,
+    migrate_legacy_log,
+    normalize_goals,
+)
+
+
+def test_append_log_writes_one_json_line(tmp_path) -> None:
+    """Each entry is a newline-terminated JSON line, visible before close."""
+    log_file = tmp_path / "wellness_log.jsonl"
+
+    with open(log_file, "ab") as log_fd:
+        append_log(log_fd, {"mood": "calm", "goals": ["walk"]})
+        append_log(log_fd, {"mood": "tired", "goals": []})
+
+        lines = log_file.read_bytes().splitlines()
+
+    assert [orjson.loads(line) for line in lines] == [
+        {"mood": "calm", "goals": ["walk"]},
+        {"mood": "tired", "goals": []},
+    ]
+
+
+def test_normalize_goals() -> None:
+    """Lists become tuples and a bare string becomes a single goal."""
+    assert normalize_goals(["walk", "read"]) == ("walk", "read")
+    assert normalize_goals(("walk",)) == ("walk",)
+    assert normalize_goals([]) == ()
+    assert normalize_goals("drink water") == ("drink water",)
+
+
+def test_load_recent_logs_returns_last_n(tmp_path, monkeypatch) -> None:
+    """Only the newest n entries are returned, oldest first."""
+    log_file = tmp_path / "wellness_log.jsonl"
+    log_file.write_bytes(b"".join(orjson.dumps({"i": i}) + b"\n" for i in range(5)))
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(log_file))
+
+    assert load_recent_logs_from_disk(3) == [{"i": 2}, {"i": 3}, {"i": 4}]
+
+
+def test_load_recent_logs_skips_malformed_lines(tmp_path, monkeypatch) -> None:
+    """A truncated line is skipped without dropping the rest of the history."""
+    log_file = tmp_path / "wellness_log.jsonl"
+    log_file.write_bytes(b'{"i": 0}\n\n{"i": 1}\n{"i": 2, "mo')
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(log_file))
+
+    assert load_recent_logs_from_disk(10) == [{"i": 0}, {"i": 1}]
+
+
+def test_load_recent_logs_missing_file(tmp_path, monkeypatch) -> None:
+    """A missing log file means no history."""
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(tmp_path / "missing.jsonl"))
+
+    assert load_recent_logs_from_disk(10) == []
+
+
+def test_migrate_legacy_log_converts_json_list(tmp_path, monkeypatch) -> None:
+    """The old JSON list is rewritten as JSONL when no JSONL log exists yet."""
+    legacy_file = tmp_path / "wellness_log.json"
+    log_file = tmp_path / "wellness_log.jsonl"
+    legacy_file.write_bytes(orjson.dumps([{"i": 0}, {"i": 1}]))
+    monkeypatch.setattr(wellness_agent, "LEGACY_LOG_FILE", str(legacy_file))
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(log_file))
+
+    migrate_legacy_log()
+
+    assert load_recent_logs_from_disk(10) == [{"i": 0}, {"i": 1}]
+
+
+def test_migrate_legacy_log_keeps_existing_jsonl(tmp_path, monkeypatch, caplog) -> None:
+    """An existing JSONL log is never overwritten; the old file is reported."""
+    legacy_file = tmp_path / "wellness_log.json"
+    log_file = tmp_path / "wellness_log.jsonl"
+    legacy_file.write_bytes(orjson.dumps([{"i": 0}]))
+    log_file.write_bytes(b'{"i": 1}\n')
+    monkeypatch.setattr(wellness_agent, "LEGACY_LOG_FILE", str(legacy_file))
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(log_file))
+
+    with caplog.at_level(logging.WARNING, logger="wellness_agent"):
+        migrate_legacy_log()
+
+    assert load_recent_logs_from_disk(10) == [{"i": 1}]
+    assert "Ignoring" in caplog.text
+
+
+def _job_userdata(monkeypatch, log_file, log_fd=None):
+    """Point the agent at a fake job context whose process owns log_fd."""
+    userdata = {
+        "pending_writes": set(),
+        "wellness_logs": deque(maxlen=wellness_agent.RECENT_LOGS_LIMIT),
+    }
+    if log_fd is not None:
+        userdata["log_fd"] = log_fd
+    job_ctx = SimpleNamespace(proc=SimpleNamespace(userdata=userdata))
+    monkeypatch.setattr(wellness_agent, "get_job_context", lambda: job_ctx)
+    monkeypatch.setattr(wellness_agent, "LOG_FILE", str(log_file))
+    return userdata
+
+
+async def test_save_checkin_writes_in_background(tmp_path, monkeypatch) -> None:
+    """The entry is written by a background task that close_log waits for."""
+    log_file = tmp_path / "wellness_log.jsonl"
+    log_fd = open(log_file, "ab")  # noqa: SIM115
+    userdata = _job_userdata(monkeypatch, log_file, log_fd)
+
+    reply = await WellnessAssistant().save_checkin(
+        None, mood="calm", goals="walk", summary="Calm, wants a walk."
+    )
+    await close_log(userdata)
+
+    assert "saved" in reply
+    assert log_fd.closed
+    assert "log_fd" not in userdata
+    [entry] = [orjson.loads(line) for line in log_file.read_bytes().splitlines()]
+    assert entry["mood"] == "calm"
+    assert entry["goals"] == ["walk"]
+    [logged] = userdata["wellness_logs"]
+    assert logged["summary"] == "Calm, wants a walk."
+
+
+async def test_save_checkin_after_close_writes_synchronously(
+    tmp_path, monkeypatch
+) -> None:
+    """Once the shared handle is closed, a check-in is written before replying."""
+    log_file = tmp_path / "wellness_log.jsonl"
+    userdata = _job_userdata(monkeypatch, log_file, open(log_file, "ab"))  # noqa: SIM115
+    await close_log(userdata)
+
+    await WellnessAssistant().save_checkin(
+        None, mood="tired", goals=["rest"], summary="Tired, will rest."
+    )
+
+    assert not userdata["pending_writes"]
+    [entry] = [orjson.loads(line) for line in log_file.read_bytes().splitlines()]
+    assert entry["goals"] == ["rest"]
+
+
+async def test_close_log_logs_failed_writes(tmp_path, monkeypatch, caplog) -> None:
+    """A failed background write is logged and does not stop the close."""
+    log_file = tmp_path / "wellness_log.jsonl"
+    log_fd = open(log_file, "ab")  # noqa: SIM115
+    userdata = _job_userdata(monkeypatch, log_file, log_fd)
+
+    def failing_append_log(log_fd, entry):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(wellness_agent, "append_log", failing_append_log)
+
+    with caplog.at_level(logging.ERROR, logger="wellness_agent"):
+        await WellnessAssistant().save_checkin(
+            None, mood="calm", goals=[], summary="Calm."
+        )
+        await close_log(userdata)
+
+    assert log_fd.closed
+    assert "Failed to save wellness check-in" in caplog.text